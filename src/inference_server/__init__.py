@@ -15,21 +15,24 @@ Pluggable Python HTTP web service (WSGI) for real-time AI/ML model inference com
 
 import enum
 import functools
-import http
+import io
 import logging
-from typing import TYPE_CHECKING
+import os
+import threading
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Optional, Tuple, Union, cast
 
 import codetiming
-import orjson
-import werkzeug
 import werkzeug.exceptions
+import werkzeug.http
+import werkzeug.utils
+import werkzeug.wsgi
 from werkzeug.datastructures import MIMEAccept
 
 import inference_server._plugin
 from inference_server._plugin import hook as plugin_hook
 
 if TYPE_CHECKING:
-    from _typeshed.wsgi import WSGIApplication
+    from _typeshed.wsgi import StartResponse, WSGIApplication, WSGIEnvironment
 
 try:
     from importlib import metadata
@@ -50,9 +53,21 @@ __version__ = metadata.version("inference-server")
 
 #: Well known location for model artifacts
 _MODEL_DIR = "/opt/ml/model"
+#: The model as loaded by the ``model_fn`` hook, ``None`` until first used
+_MODEL_OBJ: Optional[inference_server._plugin.ModelType] = None
+#: Lock ensuring the model is loaded only once when using multiple threads per process
+_MODEL_LOCK = threading.Lock()
 
 logger = logging.getLogger(__package__)
 
+#: WSGI response status lines
+_STATUS_OK = "200 OK"
+_STATUS_SERVICE_UNAVAILABLE = "503 Service Unavailable"
+_STATUS_NOT_FOUND = "404 Not Found"
+
+#: Response body for requests for unknown paths
+_NOT_FOUND_BODY = b"Not Found"
+
 
 class BatchStrategy(enum.Enum):
     """
@@ -75,7 +90,13 @@ def create_app() -> "WSGIApplication":
     Initialize and return the WSGI application
 
     This is the WSGI application factory function that needs to be passed to a WSGI-compatible web server.
+
+    If the environment variable ``INFERENCE_SERVER_WARMUP`` is set to ``1``, the model is loaded immediately using
+    :func:`warmup`. With Gunicorn's ``preload_app`` setting, this loads the model once in the main process before
+    forking the workers.
     """
+    if os.environ.get("INFERENCE_SERVER_WARMUP") == "1":
+        warmup()
     return _app
 
 
@@ -85,82 +106,216 @@ def warmup() -> None:
 
     This will call the ``model_fn`` plugin hook.
     """
-    _model()
+    _get_model()
 
 
-@werkzeug.Request.application
-def _app(request: werkzeug.Request) -> werkzeug.Response:
+def _app(environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
     """Return the WSGI application"""
     try:
-        route_handler = _ROUTES[(request.method, request.path)]
-    except KeyError:
-        raise werkzeug.exceptions.NotFound()
-    response = route_handler(request)
-    return response
-
-
-def _handle_invocations(request: werkzeug.Request) -> werkzeug.Response:
+        route = _ROUTES.get(environ.get("PATH_INFO", ""))
+        if route is None:
+            return _handle_not_found(environ, start_response)
+        route_handler, method = route
+        if environ["REQUEST_METHOD"] != method:
+            raise werkzeug.exceptions.MethodNotAllowed(valid_methods=[method])
+        return route_handler(environ, start_response)
+    except werkzeug.exceptions.HTTPException as exc:
+        # Plugins may raise HTTP exceptions too, e.g. for an unsupported content type
+        return exc(environ, start_response)
+
+
+def _handle_invocations(environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
     """
     Handle an incoming inference POST request
 
-    :param request: HTTP request data
+    :param environ:        WSGI environment for the HTTP request
+    :param start_response: WSGI callable to start the HTTP response
     """
-    with codetiming.Timer(text="Invocation took {:.3f} seconds", logger=logger.debug):
-        pm = inference_server._plugin.manager()
-        # Deserialize HTTP body payload (bytes) into input features
-        data = pm.hook.input_fn(input_data=request.data, content_type=request.content_type)
-        # Then use the model to make a prediction
-        prediction = pm.hook.predict_fn(data=data, model=_model())
-        # Then serialize the data as bytes. This is often (but not necessarily) JSON bytes.
-        prediction_bytes, content_type = pm.hook.output_fn(prediction=prediction, accept=request.accept_mimetypes)
-        return werkzeug.Response(prediction_bytes, mimetype=content_type)
-
-
-def _handle_ping(request: werkzeug.Request) -> werkzeug.Response:
+    if logger.isEnabledFor(logging.DEBUG):
+        with codetiming.Timer(text="Invocation took {:.3f} seconds", logger=logger.debug):
+            prediction_body, content_type = _invoke(environ)
+    else:
+        prediction_body, content_type = _invoke(environ)
+    # Like werkzeug.Response, default to plain text if the hook does not return a MIME type
+    headers = [("Content-Type", werkzeug.utils.get_content_type(content_type or "text/plain", "utf-8"))]
+    if isinstance(prediction_body, str):
+        prediction_body = prediction_body.encode("utf-8")  # Like werkzeug.Response, for backwards compatibility
+    if isinstance(prediction_body, (bytes, bytearray)):
+        headers.append(("Content-Length", str(len(prediction_body))))
+        start_response(_STATUS_OK, headers)
+        return [prediction_body]
+    if hasattr(prediction_body, "read"):
+        # A file-like object, which the WSGI server may send efficiently (e.g. using sendfile) if it supports that
+        prediction_file = cast(BinaryIO, prediction_body)
+        content_length = _remaining_length(prediction_file)
+        if content_length is not None:
+            headers.append(("Content-Length", str(content_length)))
+        start_response(_STATUS_OK, headers)
+        return werkzeug.wsgi.wrap_file(environ, prediction_file)
+    # An iterable of chunks, sent by the WSGI server as these are produced
+    start_response(_STATUS_OK, headers)
+    return prediction_body
+
+
+def _invoke(environ: "WSGIEnvironment") -> Tuple[Union[bytes, BinaryIO, Iterable[bytes]], str]:
     """
-    Handle an incoming ping HEAD request
+    Return the prediction for an inference request as bytes (or a binary file or an iterable of bytes chunks) along
+    with the corresponding MIME type
 
-    :param request: HTTP request data
+    :param environ: WSGI environment for the HTTP request
     """
-    pm = inference_server._plugin.manager()
-    if pm.hook.ping_fn(model=_model()):
-        status = http.HTTPStatus.OK
+    hooks = inference_server._plugin.hooks()
+    body: Optional[bytes] = None
+    if hooks.invoke_fn is not None:
+        # A plugin handles deserialization, prediction and serialization in one go, unless it returns None
+        body = _read_body(environ)
+        result = hooks.invoke_fn(
+            input_data=body,
+            content_type=environ.get("CONTENT_TYPE"),
+            accept=_parse_accept(environ.get("HTTP_ACCEPT")),
+            model=_get_model(),
+        )
+        if result is not None:
+            return result
+    # Deserialize HTTP body payload into input features, streaming the payload if a plugin supports that
+    if hooks.input_stream_fn is not None:
+        data = hooks.input_stream_fn(
+            stream=werkzeug.wsgi.get_input_stream(environ) if body is None else io.BytesIO(body),
+            content_length=werkzeug.wsgi.get_content_length(environ),
+            content_type=environ.get("CONTENT_TYPE"),
+        )
+        if data is None:
+            # Unlike other hooks, we cannot fall back to input_fn since the stream may have been consumed already
+            raise TypeError("input_stream_fn hook returned None, expected deserialized input data")
+    elif hooks.input_fn is default_plugin.input_fn:
+        data = _read_body(environ) if body is None else body  # Bytes pass-through, no need to call the hook
     else:
-        status = http.HTTPStatus.SERVICE_UNAVAILABLE
-    return werkzeug.Response(status=status)
+        data = hooks.input_fn(
+            input_data=_read_body(environ) if body is None else body, content_type=environ.get("CONTENT_TYPE")
+        )
+    # Then use the model to make a prediction
+    prediction = hooks.predict_fn(data=data, model=_get_model())
+    # Then serialize the data as bytes. This is often (but not necessarily) JSON bytes.
+    if hooks.output_iter_fn is not None:
+        result = hooks.output_iter_fn(prediction=prediction, accept=_parse_accept(environ.get("HTTP_ACCEPT")))
+        if result is not None:
+            return result
+    if hooks.output_fn is default_plugin.output_fn:
+        return prediction, "application/octet-stream"  # Bytes pass-through, no need to call the hook
+    accept = _parse_accept(environ.get("HTTP_ACCEPT"))
+    return hooks.output_fn(prediction=prediction, accept=accept)
+
+
+def _handle_ping(environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
+    """
+    Handle an incoming ping GET request
+
+    :param environ:        WSGI environment for the HTTP request
+    :param start_response: WSGI callable to start the HTTP response
+    """
+    hooks = inference_server._plugin.hooks()
+    status = _STATUS_OK if hooks.ping_fn(model=_get_model()) else _STATUS_SERVICE_UNAVAILABLE
+    start_response(status, [("Content-Length", "0")])
+    return []
 
 
-def _handle_execution_parameters(request: werkzeug.Request):
+def _handle_execution_parameters(environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
     """
     Handle an incoming execution-parameters GET request
 
     This will enable BatchTransform job to choose the optimal tuning parameters during runtime.
-    :param request: HTTP request data
+
+    :param environ:        WSGI environment for the HTTP request
+    :param start_response: WSGI callable to start the HTTP response
+    """
+    body = inference_server._plugin.execution_parameters_body()
+    start_response(_STATUS_OK, [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def _remaining_length(file: BinaryIO) -> Optional[int]:
+    """
+    Return the number of bytes remaining to be read from a file, or ``None`` if the file is not seekable
+
+    :param file: Binary file-like object
+    """
+    if not (hasattr(file, "seekable") and file.seekable()):
+        return None
+    position = file.tell()
+    end = file.seek(0, io.SEEK_END)
+    file.seek(position)
+    return end - position
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_accept(header: Optional[str]) -> MIMEAccept:
+    """
+    Return the parsed HTTP Accept header
+
+    Clients typically send the same few Accept headers, so parsed values are cached. This is safe as
+    :class:`MIMEAccept` objects are immutable.
+
+    :param header: Raw HTTP Accept header value
+    """
+    return werkzeug.http.parse_accept_header(header, MIMEAccept)
+
+
+def _read_body(environ: "WSGIEnvironment") -> bytes:
+    """
+    Return the HTTP request body
+
+    :param environ: WSGI environment for the HTTP request
     """
-    pm = inference_server._plugin.manager()
-    response_data = {
-        "BatchStrategy": pm.hook.batch_strategy(),
-        "MaxConcurrentTransforms": pm.hook.max_concurrent_transforms(),
-        "MaxPayloadInMB": pm.hook.max_payload_in_mb(),
-    }
-    return werkzeug.Response(orjson.dumps(response_data), mimetype="application/json")
+    content_length = werkzeug.wsgi.get_content_length(environ)
+    if content_length is not None:
+        return environ["wsgi.input"].read(content_length)
+    if environ.get("wsgi.input_terminated"):
+        # Chunked transfer encoding, the server guarantees the stream ends with the body
+        return environ["wsgi.input"].read()
+    return b""
+
 
+def _handle_not_found(environ: "WSGIEnvironment", start_response: "StartResponse") -> Iterable[bytes]:
+    """
+    Handle an incoming request for an unknown path
+
+    :param environ:        WSGI environment for the HTTP request
+    :param start_response: WSGI callable to start the HTTP response
+    """
+    start_response(
+        _STATUS_NOT_FOUND,
+        [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(_NOT_FOUND_BODY)))],
+    )
+    return [_NOT_FOUND_BODY]
 
-# Stupidly simple request routing
+
+# Stupidly simple request routing, mapping a path to its handler and HTTP method
 _ROUTES = {
-    ("GET", "/execution-parameters"): _handle_execution_parameters,
-    ("POST", "/invocations"): _handle_invocations,
-    ("GET", "/ping"): _handle_ping,
+    "/execution-parameters": (_handle_execution_parameters, "GET"),
+    "/invocations": (_handle_invocations, "POST"),
+    "/ping": (_handle_ping, "GET"),
 }
 
 
-@functools.lru_cache(maxsize=None)
-def _model() -> inference_server._plugin.ModelType:
+def _get_model() -> inference_server._plugin.ModelType:
     """
-    Load a previously serialized ML model from a given filesystem directory
+    Return the model, loading a previously serialized ML model from a given filesystem directory on first use
+
+    The caller holds on to the returned model object, so replacing the global model cannot affect requests which are
+    being handled already.
     """
-    pm = inference_server._plugin.manager()
-    logger.info("Loading model using 'model_fn' hook...")
-    model = pm.hook.model_fn(model_dir=_MODEL_DIR)
-    logger.info("Finished loading model %s", model)
+    global _MODEL_OBJ
+
+    model = _MODEL_OBJ
+    if model is None:
+        with _MODEL_LOCK:
+            model = _MODEL_OBJ  # Another thread may have loaded the model while we waited for the lock
+            if model is None:
+                logger.info("Loading model using 'model_fn' hook...")
+                model = _MODEL_OBJ = inference_server._plugin.hooks().model_fn(model_dir=_MODEL_DIR)
+                logger.info("Finished loading model %s", model)
     return model
+
+
+# Imported last as the default plugin itself depends on this module
+from inference_server import default_plugin  # noqa: E402
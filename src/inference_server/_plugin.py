@@ -15,11 +15,24 @@ Plugin logic
 Hook definitions adapted from https://docs.aws.amazon.com/sagemaker/latest/dg/adapt-inference-container.html
 """
 
-import functools
 import logging
 import sys
-from typing import TYPE_CHECKING, Any, Tuple
-
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import orjson
 import pluggy
 import werkzeug.datastructures
 
@@ -37,6 +50,19 @@ hook = pluggy.HookimplMarker(__package__)
 #: Decorator for plugin hook function specifications/signatures
 hookspec = pluggy.HookspecMarker(__package__)
 
+#: The plugin manager, ``None`` until first used
+_MANAGER: Optional["_PluginManager"] = None
+#: The hooks as plain functions, ``None`` until first used or after plugins have been (un)registered
+_HOOKS: Optional["Hooks"] = None
+#: The hook implementation functions by hook name, ``None`` until first used or after plugins have been (un)registered
+_HOOKIMPL_FUNCTIONS: Optional[Dict[str, FrozenSet[Callable]]] = None
+#: JSON response body for the execution parameters, ``None`` until first used or after plugins have been (un)registered
+_EXECUTION_PARAMETERS_BODY: Optional[bytes] = None
+#: Incremented whenever plugins are (un)registered, such that values resolved in the meantime are not cached
+_GENERATION = 0
+#: Lock ensuring a resolved value is not cached after plugins have been (un)registered concurrently
+_CACHE_LOCK = threading.Lock()
+
 
 @hookspec(firstresult=True)
 def model_fn(model_dir: str) -> ModelType:
@@ -83,6 +109,27 @@ def input_fn(input_data: bytes, content_type: str) -> DataType:
     raise NotImplementedError
 
 
+@hookspec(firstresult=True)
+def input_stream_fn(stream: BinaryIO, content_length: Optional[int], content_type: str) -> DataType:
+    """
+    A function which reads data sent over an HTTP connection directly from the request stream and converts it to the
+    input data format the model is expecting.
+
+    This is an optional alternative to :func:`input_fn`. When implemented, :func:`input_fn` is not called and the HTTP
+    body is not read into memory as a single :class:`bytes` object first. This may be useful for large payloads which
+    can be parsed incrementally.
+
+    This hook must return the input data for every request since the stream cannot be read again by :func:`input_fn`.
+    Returning ``None`` results in a :exc:`TypeError`.
+
+    :param stream:         Binary file-like object for reading the raw HTTP body data
+    :param content_length: The length of the body data in bytes, or ``None`` if not known in advance (chunked transfer
+                           encoding)
+    :param content_type:   The content type (MIME) corresponding with the body data, e.g. ``application/json``
+    """
+    raise NotImplementedError
+
+
 @hookspec(firstresult=True)
 def predict_fn(data: DataType, model: ModelType) -> PredictionType:
     """
@@ -103,7 +150,9 @@ def predict_fn(data: DataType, model: ModelType) -> PredictionType:
 
 
 @hookspec(firstresult=True)
-def output_fn(prediction: PredictionType, accept: werkzeug.datastructures.MIMEAccept) -> Tuple[bytes, str]:
+def output_fn(
+    prediction: PredictionType, accept: werkzeug.datastructures.MIMEAccept
+) -> Tuple[Union[bytes, BinaryIO], str]:
     """
     A function which seriazizes and returns the prediction as bytes along with the corresponding MIME type.
 
@@ -112,12 +161,62 @@ def output_fn(prediction: PredictionType, accept: werkzeug.datastructures.MIMEAc
     :func:`output_fn` implementation should therefore compare the ``accept`` argument value with the implemented
     serialization format(s).
 
+    Instead of bytes, a binary file-like object may be returned, for example an open file or :class:`io.BytesIO`. This
+    is sent by the web server without reading it into memory first where supported. The file is closed once sent.
+
+    :param prediction: The output from the model as return by :func:`predict_fn`
+    :param accept:     MIME type(s) requested/accepted by the client, e.g. ``application/json``
+    """
+    raise NotImplementedError
+
+
+@hookspec(firstresult=True)
+def output_iter_fn(
+    prediction: PredictionType, accept: werkzeug.datastructures.MIMEAccept
+) -> Tuple[Iterable[bytes], str]:
+    """
+    A function which serializes the prediction as an iterable of bytes chunks along with the corresponding MIME type.
+
+    This is an optional alternative to :func:`output_fn`. When implemented, :func:`output_fn` is not called and the
+    chunks are sent to the client as they are produced. For example, if :func:`predict_fn` returns a generator of
+    predictions for a batch of records, this function could return a generator of JSON lines. The client may then
+    start receiving the first predictions while subsequent predictions are still being computed.
+
+    Any errors raised while iterating over the chunks cannot be reported to the client as an HTTP error response since
+    the response has been started already.
+
+    Return ``None`` to serialize the prediction using :func:`output_fn` instead, for example for MIME types for which
+    chunked output is not supported.
+
     :param prediction: The output from the model as return by :func:`predict_fn`
     :param accept:     MIME type(s) requested/accepted by the client, e.g. ``application/json``
     """
     raise NotImplementedError
 
 
+@hookspec(firstresult=True)
+def invoke_fn(
+    input_data: bytes, content_type: str, accept: werkzeug.datastructures.MIMEAccept, model: ModelType
+) -> Tuple[Union[bytes, BinaryIO], str]:
+    """
+    A function which deserializes the input data, invokes the model and serializes the prediction in a single step.
+
+    This is an optional alternative to implementing :func:`input_fn`, :func:`predict_fn` and :func:`output_fn`. When
+    implemented, those hooks are not called. This may be useful if the model can process the serialized data directly,
+    avoiding the intermediate deserialized data and prediction objects.
+
+    Like :func:`output_fn`, this returns the serialized prediction along with the corresponding MIME type. Return
+    ``None`` to handle the request using :func:`input_fn` (or :func:`input_stream_fn`), :func:`predict_fn` and
+    :func:`output_fn` instead, for example for content types the model cannot process directly.
+
+    :param input_data:   Raw HTTP body data
+    :param content_type: The content type (MIME) corresponding with the body data, e.g. ``application/json``
+    :param accept:       MIME type(s) requested/accepted by the client, e.g. ``application/json``
+    :param model:        Model object (the output from :func:`model_fn`)
+    """
+    raise NotImplementedError
+
+
 @hookspec(firstresult=True)
 def batch_strategy() -> "inference_server.BatchStrategy":
     """
@@ -158,17 +257,63 @@ def max_payload_in_mb() -> int:
     raise NotImplementedError
 
 
-@functools.lru_cache(maxsize=None)
-def manager() -> pluggy.PluginManager:
+class _PluginManager(pluggy.PluginManager):
+    """Plugin manager which discards the cached hook (implementation) functions whenever plugins are (un)registered"""
+
+    def __init__(self, project_name: str) -> None:
+        """Initialize the plugin manager"""
+        super().__init__(project_name)
+        #: Number of active hook call monitors, while any are active hooks must be dispatched by pluggy
+        self.monitors = 0
+
+    def register(self, plugin: Any, name: Optional[str] = None) -> Optional[str]:
+        """Register a plugin and return its name"""
+        try:
+            return super().register(plugin, name=name)
+        finally:
+            _reset_caches()
+
+    def unregister(self, plugin: Any = None, name: Optional[str] = None) -> Any:
+        """Unregister a plugin and all of its hook implementations"""
+        try:
+            return super().unregister(plugin=plugin, name=name)
+        finally:
+            _reset_caches()
+
+    def add_hookcall_monitoring(self, before: Callable, after: Callable) -> Callable[[], None]:
+        """Add before/after tracing functions for all hooks and return an undo function"""
+        undo_monitoring = super().add_hookcall_monitoring(before, after)
+        self.monitors += 1
+        _reset_caches()
+
+        def undo() -> None:
+            """Remove the tracing functions again"""
+            undo_monitoring()
+            self.monitors -= 1
+            _reset_caches()
+
+        return undo
+
+
+def manager() -> _PluginManager:
     """
     Return a manager to discover and load plugins for providing hooks
 
     Plugins are automatically loaded through (setuptools) entrypoints, group ``inference_server``.
     """
+    global _MANAGER
+
+    if _MANAGER is None:
+        _MANAGER = _load_manager()
+    return _MANAGER
+
+
+def _load_manager() -> _PluginManager:
+    """Initialize a plugin manager and load all plugins"""
     from inference_server import default_plugin
 
     logger.debug("Initializing plugin manager for '%s'", __package__)
-    manager_ = pluggy.PluginManager(__package__)
+    manager_ = _PluginManager(__package__)
     manager_.add_hookspecs(sys.modules[__name__])
 
     logger.debug("Loading default plugin '%s'", default_plugin.__name__)
@@ -177,3 +322,140 @@ def manager() -> pluggy.PluginManager:
     manager_.load_setuptools_entrypoints(group=__package__)
     logger.debug("Loaded plugins: %s", manager_.get_plugins())
     return manager_
+
+
+class Hooks(NamedTuple):
+    """
+    The **inference-server** hooks as plain functions
+
+    The optional hooks are ``None`` if not implemented by any plugin. All other hooks are implemented by the default
+    plugin at least.
+    """
+
+    model_fn: Callable[..., Any]
+    ping_fn: Callable[..., Any]
+    input_fn: Callable[..., Any]
+    input_stream_fn: Optional[Callable[..., Any]]
+    predict_fn: Callable[..., Any]
+    output_fn: Callable[..., Any]
+    output_iter_fn: Optional[Callable[..., Any]]
+    invoke_fn: Optional[Callable[..., Any]]
+    batch_strategy: Callable[..., Any]
+    max_concurrent_transforms: Callable[..., Any]
+    max_payload_in_mb: Callable[..., Any]
+
+
+def hooks() -> Hooks:
+    """
+    Return the hooks as plain functions, e.g. ``hooks().input_fn(input_data=..., content_type=...)``
+
+    Calling these functions bypasses pluggy's generic hook dispatch logic while producing the same results. The
+    functions are resolved once and discarded again whenever plugins are registered or unregistered.
+    """
+    global _HOOKS
+
+    hooks_ = _HOOKS  # Plugins may be (un)registered concurrently, resetting the global
+    if hooks_ is None:
+        generation = _GENERATION
+        hooks_ = _load_hooks()
+        with _CACHE_LOCK:
+            if generation == _GENERATION:  # Otherwise the hooks may be stale already
+                _HOOKS = hooks_
+    return hooks_
+
+
+def _load_hooks() -> Hooks:
+    """Resolve the hooks as plain functions"""
+    pm = manager()
+    monitored = pm.monitors > 0
+    return Hooks._make(_direct_caller(getattr(pm.hook, name), monitored=monitored) for name in Hooks._fields)
+
+
+def hookimpl_functions() -> Dict[str, FrozenSet[Callable]]:
+    """
+    Return the functions implementing each hook, by hook name
+
+    The functions are collected once and discarded again whenever plugins are registered or unregistered.
+    """
+    global _HOOKIMPL_FUNCTIONS
+
+    hookimpl_functions_ = _HOOKIMPL_FUNCTIONS  # Plugins may be (un)registered concurrently, resetting the global
+    if hookimpl_functions_ is None:
+        generation = _GENERATION
+        hookimpl_functions_ = _load_hookimpl_functions()
+        with _CACHE_LOCK:
+            if generation == _GENERATION:  # Otherwise the functions may be stale already
+                _HOOKIMPL_FUNCTIONS = hookimpl_functions_
+    return hookimpl_functions_
+
+
+def _load_hookimpl_functions() -> Dict[str, FrozenSet[Callable]]:
+    """Collect the functions implementing each hook"""
+    return {
+        name: frozenset(impl.function for impl in caller.get_hookimpls())
+        for name, caller in vars(manager().hook).items()
+    }
+
+
+def execution_parameters_body() -> bytes:
+    """
+    Return the execution parameters as JSON bytes, calling the Batch Transform hooks on first use only
+
+    The hooks return static configuration values, so the response body is discarded again only whenever plugins are
+    registered or unregistered.
+    """
+    global _EXECUTION_PARAMETERS_BODY
+
+    body = _EXECUTION_PARAMETERS_BODY  # Plugins may be (un)registered concurrently, resetting the global
+    if body is None:
+        generation = _GENERATION
+        hooks_ = hooks()
+        response_data = {
+            "BatchStrategy": hooks_.batch_strategy(),
+            "MaxConcurrentTransforms": hooks_.max_concurrent_transforms(),
+            "MaxPayloadInMB": hooks_.max_payload_in_mb(),
+        }
+        body = orjson.dumps(response_data)
+        with _CACHE_LOCK:
+            if generation == _GENERATION:  # Otherwise the body may be stale already
+                _EXECUTION_PARAMETERS_BODY = body
+    return body
+
+
+def _reset_caches() -> None:
+    """Discard the hook (implementation) functions and derived values such that these are resolved again on next use"""
+    global _HOOKS, _HOOKIMPL_FUNCTIONS, _EXECUTION_PARAMETERS_BODY, _GENERATION
+
+    with _CACHE_LOCK:
+        _GENERATION += 1
+        _HOOKS = None
+        _HOOKIMPL_FUNCTIONS = None
+        _EXECUTION_PARAMETERS_BODY = None
+
+
+def _direct_caller(caller: pluggy.HookCaller, *, monitored: bool) -> Union[Callable[..., Any], pluggy.HookCaller, None]:
+    """
+    Return a function calling a ``firstresult`` hook's implementations directly, or ``None`` if not implemented
+
+    Hook wrappers and hook call monitoring require pluggy's full dispatch logic, in which case the pluggy hook caller
+    itself is returned. A single implementation accepting all hook arguments is returned as is.
+    """
+    impls = caller.get_hookimpls()
+    if not impls:
+        return None
+    if monitored or any(impl.hookwrapper or getattr(impl, "wrapper", False) for impl in impls):
+        return caller
+    if len(impls) == 1 and caller.spec and set(impls[0].argnames) == set(caller.spec.argnames):
+        return impls[0].function
+    # Like pluggy, call implementations in reverse order and pass only the arguments each implementation declares
+    functions = [(impl.function, impl.argnames) for impl in reversed(impls)]
+
+    def call(**kwargs: Any) -> Any:
+        """Return the first non-``None`` result from the hook implementations"""
+        for function, argnames in functions:
+            result = function(*[kwargs[argname] for argname in argnames])
+            if result is not None:
+                return result
+        return None
+
+    return call
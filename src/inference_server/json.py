@@ -0,0 +1,82 @@
+# Copyright 2023 J.P. Morgan Chase & Co.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not use this file except in compliance with
+# the License. You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
+# specific language governing permissions and limitations under the License.
+
+"""
+Fast JSON serialization functions for implementing **inference-server** plugin hooks
+"""
+
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+import orjson
+
+try:
+    import simdjson
+except ImportError:  # pragma: no cover
+    # Optional dependency
+    simdjson = None  # type: ignore[assignment]
+
+__all__ = (
+    "dumps",
+    "loads",
+)
+
+#: Serialize a Python object as JSON bytes, see :func:`orjson.dumps`
+dumps = orjson.dumps
+
+# simdjson parsers are not thread-safe, so we need one per thread
+_local = threading.local()
+
+
+def loads(data: bytes, *, keys: Optional[Sequence[str]] = None) -> Any:
+    """
+    Deserialize JSON bytes and return the Python object
+
+    Where a JSON object contains many fields but only a few are actually needed, specify the required top-level fields
+    using ``keys``. If :mod:`simdjson` is installed, only these fields are then converted to Python objects, which can
+    be substantially faster for large payloads. Without :mod:`simdjson`, the entire object is deserialized using
+    :mod:`orjson` before selecting the fields.
+
+    :param data: JSON bytes
+    :param keys: Optional. The top-level fields to return from a JSON object. Raises :exc:`KeyError` if a field is
+                 missing.
+    :return:     The deserialized data, or a dictionary with just the specified fields if ``keys`` is given.
+    """
+    if keys is None:
+        return orjson.loads(data)
+    if simdjson is None:
+        obj = orjson.loads(data)
+        return {key: obj[key] for key in keys}
+    return _simdjson_loads_keys(data, keys)
+
+
+def _simdjson_loads_keys(data: bytes, keys: Sequence[str]) -> Dict[str, Any]:
+    """Deserialize the given fields only from a JSON object using :mod:`simdjson`"""
+    try:
+        parser = _local.parser
+    except AttributeError:
+        parser = _local.parser = simdjson.Parser()
+    doc = parser.parse(data)
+    try:
+        return {key: _to_python(doc[key]) for key in keys}
+    finally:
+        # The parsed document must not outlive this function as the parser is reused for the next document. This
+        # includes any traceback for a missing key, which would otherwise reference the document.
+        del doc
+
+
+def _to_python(value: Any) -> Any:
+    """Return a value from a :mod:`simdjson` document as a plain Python object"""
+    if isinstance(value, simdjson.Object):
+        return value.as_dict()
+    if isinstance(value, simdjson.Array):
+        return value.as_list()
+    return value
@@ -16,7 +16,7 @@ Functions for testing **inference-server** plugins
 import io
 import pathlib
 from types import ModuleType
-from typing import Any, Callable, Optional, Protocol, Tuple, Type, Union
+from typing import Any, Callable, List, Optional, Protocol, Tuple, Type, Union
 
 import botocore.response  # type: ignore[import-untyped]
 import pluggy
@@ -107,12 +107,78 @@ def predict(
         "Accept": ", ".join(deserializer.ACCEPT),  # The deserializer dictates the content-type of the prediction
     }
     prediction_response = post_invocations(model_dir=model_dir, data=serialized_data, headers=http_headers)
+    return _deserialize(deserializer, prediction_response.data, content_type=prediction_response.content_type)
+
+
+def predict_direct(
+    data: Any,
+    *,
+    model_dir: Optional[pathlib.Path] = None,
+    serializer: Optional[ImplementsSerialize] = None,
+    deserializer: Optional[ImplementsDeserialize] = None,
+) -> Any:
+    """
+    Invoke the model and return a prediction, calling the WSGI application directly instead of using an HTTP test client
+
+    This is a faster alternative to :func:`predict` for tests making many predictions. The same **inference-server**
+    logic is used to handle the invocation, but no HTTP request and response objects are created. Use :func:`predict`
+    to test a prediction using the full HTTP client logic.
+
+    :param data:         Model input data
+    :param model_dir:    Optional pass a custom model directory to load the model from. Default is
+                         :file:`/opt/ml/model/`.
+    :param serializer:   Optional. A serializer for sending the data as bytes to the model server. Should be compatible
+                         with :class:`sagemaker.serializers.BaseSerializer`. Default: bytes pass-through.
+    :param deserializer: Optional. A deserializer for processing the prediction as sent by the model server. Should be
+                         compatible with :class:`sagemaker.deserializers.BaseDeserializer`. Default: bytes pass-through.
+    """
+    serializer = serializer or _PassThroughSerializer()
+    deserializer = deserializer or _PassThroughDeserializer()
+
+    serialized_data = serializer.serialize(data)
+    environ = {
+        "REQUEST_METHOD": "POST",
+        "PATH_INFO": "/invocations",
+        "CONTENT_TYPE": serializer.CONTENT_TYPE,
+        "CONTENT_LENGTH": str(len(serialized_data)),
+        "HTTP_ACCEPT": ", ".join(deserializer.ACCEPT),
+        "wsgi.input": io.BytesIO(serialized_data),
+    }
+    response_status: List[str] = []
+    response_headers: List[Tuple[str, str]] = []
+
+    def start_response(status: str, headers: List[Tuple[str, str]], exc_info: Any = None) -> Callable:
+        """Record the response status and headers"""
+        response_status.append(status)
+        response_headers.extend(headers)
+        return lambda data: None
+
+    # pytest should be available when we are using inference_server.testing
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        if model_dir:
+            monkeypatch.setattr(inference_server, "_MODEL_DIR", str(model_dir))
+        app_iter = inference_server.create_app()(environ, start_response)
+        try:
+            prediction_body = b"".join(app_iter)
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+    assert response_status == ["200 OK"]
+    return _deserialize(deserializer, prediction_body, content_type=dict(response_headers)["Content-Type"])
+
+
+def _deserialize(deserializer: ImplementsDeserialize, prediction_body: bytes, content_type: str) -> Any:
+    """Return the prediction deserialized from the HTTP response body"""
+    if isinstance(deserializer, _PassThroughDeserializer):
+        # No need to wrap the body as a stream only to read it back again
+        assert content_type in deserializer.ACCEPT
+        return prediction_body
     prediction_stream = botocore.response.StreamingBody(
-        raw_stream=io.BytesIO(prediction_response.data),
-        content_length=prediction_response.content_length,
+        raw_stream=io.BytesIO(prediction_body),
+        content_length=len(prediction_body),
     )
-    prediction_deserialized = deserializer.deserialize(prediction_stream, content_type=prediction_response.content_type)
-    return prediction_deserialized
+    return deserializer.deserialize(prediction_stream, content_type=content_type)
 
 
 def client() -> werkzeug.test.Client:
@@ -171,8 +237,4 @@ def hookimpl_is_valid(function: Callable) -> bool:
 
     :param function: The hook function to validate
     """
-    try:
-        hook = getattr(plugin_manager().hook, function.__name__)
-    except AttributeError:
-        return False
-    return function in (impl.function for impl in hook.get_hookimpls())
+    return function in inference_server._plugin.hookimpl_functions().get(function.__name__, ())
@@ -8,13 +8,20 @@
 # Unless required by applicable law or agreed to in writing, software distributed under the License is distributed on an
 # "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the
 # specific language governing permissions and limitations under the License.
+import io
+import logging
 import pathlib
+import sys
+import threading
+import time
 from typing import Tuple
 
 import botocore.response
 import pytest
+import werkzeug.exceptions
 
 import inference_server
+import inference_server.json
 import inference_server.testing
 
 
@@ -27,7 +34,7 @@ def reset_caches():
     try:
         yield
     finally:
-        inference_server._model.cache_clear()
+        inference_server._MODEL_OBJ = None
 
 
 @pytest.fixture
@@ -95,9 +102,63 @@ def test_warmup():
     assert inference_server.warmup() is None
 
 
+def test_create_app_warmup(monkeypatch):
+    monkeypatch.setenv("INFERENCE_SERVER_WARMUP", "1")
+    inference_server.create_app()
+    assert inference_server._MODEL_OBJ is not None
+
+
+def test_create_app_no_warmup(monkeypatch):
+    monkeypatch.delenv("INFERENCE_SERVER_WARMUP", raising=False)
+    inference_server.create_app()
+    assert inference_server._MODEL_OBJ is None
+
+
+def test_warmup_loads_model_once():
+    inference_server.warmup()
+    model = inference_server._MODEL_OBJ
+    assert model is not None
+    inference_server.warmup()
+    assert inference_server._MODEL_OBJ is model
+
+
+def test_model_loaded_once_concurrently():
+    loaded = []
+
+    class SlowModelPlugin:
+        """Plugin which takes a while to load the model"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def model_fn(model_dir: str):
+            """Return a pass-through model, slowly"""
+            time.sleep(0.05)
+            loaded.append(model_dir)
+            return lambda data: data
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(SlowModelPlugin)
+    try:
+        threads = [threading.Thread(target=inference_server.warmup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        pm.unregister(SlowModelPlugin)
+    assert len(loaded) == 1
+
+
 def test_path_not_found(client):
     response = client.get("/this-endpoint-does-not-exist")
     assert response.status_code == 404
+    assert response.data == b"Not Found"
+
+
+def test_method_not_allowed(client):
+    response = client.post("/ping")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "GET"
 
 
 def test_invocations():
@@ -108,6 +169,306 @@ def test_invocations():
     assert response.headers["Content-Type"] == "application/octet-stream"
 
 
+def test_invocations_timed_with_debug_logging(client, caplog):
+    with caplog.at_level(logging.DEBUG, logger="inference_server"):
+        client.post("/invocations", data=b"")
+    assert any(record.message.startswith("Invocation took") for record in caplog.records)
+
+
+def test_invocations_not_timed_without_debug_logging(client, caplog):
+    with caplog.at_level(logging.INFO, logger="inference_server"):
+        client.post("/invocations", data=b"")
+    assert not any(record.message.startswith("Invocation took") for record in caplog.records)
+
+
+def test_invocations_plugin_http_error(client):
+    class InputPlugin:
+        """Plugin which rejects any content type"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def input_fn(input_data, content_type):
+            """Raise an HTTP error"""
+            raise werkzeug.exceptions.UnsupportedMediaType()
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(InputPlugin)
+    try:
+        response = client.post("/invocations", data=b"", content_type="text/plain")
+    finally:
+        pm.unregister(InputPlugin)
+    assert response.status_code == 415
+
+
+def test_invocations_text_content_type(client):
+    class OutputPlugin:
+        """Plugin which returns CSV"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_fn(prediction, accept):
+            """Return the prediction as CSV"""
+            return prediction, "text/csv"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(OutputPlugin)
+    try:
+        response = client.post("/invocations", data=b"1,2,3")
+    finally:
+        pm.unregister(OutputPlugin)
+    assert response.data == b"1,2,3"
+    assert response.headers["Content-Type"] == "text/csv; charset=utf-8"
+
+
+def test_invocations_no_content_type(client):
+    class OutputPlugin:
+        """Plugin which does not return a MIME type"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_fn(prediction, accept):
+            """Return the prediction without a MIME type"""
+            return prediction, None
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(OutputPlugin)
+    try:
+        response = client.post("/invocations", data=b"1,2,3")
+    finally:
+        pm.unregister(OutputPlugin)
+    assert response.data == b"1,2,3"
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+
+
+def test_invocations_input_stream(client):
+    class StreamPlugin:
+        """Plugin which reads the HTTP body from the request stream"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def input_stream_fn(stream, content_length, content_type):
+            """Read the stream in small chunks"""
+            assert content_length == 9
+            return b"".join(iter(lambda: stream.read(2), b""))
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(StreamPlugin)
+    try:
+        response = client.post("/invocations", data=b"streaming")
+    finally:
+        pm.unregister(StreamPlugin)
+    assert response.data == b"streaming"
+
+
+def test_invocations_input_stream_fn_returns_none(client):
+    class StreamPlugin:
+        """Plugin which reads the HTTP body from the request stream but does not return anything"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def input_stream_fn(stream, content_length, content_type):
+            """Consume the stream only"""
+            stream.read()
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(StreamPlugin)
+    try:
+        with pytest.raises(TypeError, match="input_stream_fn"):
+            client.post("/invocations", data=b"streaming")
+    finally:
+        pm.unregister(StreamPlugin)
+
+
+def test_parse_accept_is_cached():
+    accept = inference_server._parse_accept("application/json, text/csv;q=0.5")
+    assert accept.best == "application/json"
+    assert inference_server._parse_accept("application/json, text/csv;q=0.5") is accept
+
+
+@pytest.fixture
+def file_output():
+    class OutputPlugin:
+        """Plugin which returns the prediction as a file-like object"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_fn(prediction, accept):
+            """Return the prediction as a BytesIO object"""
+            return io.BytesIO(prediction), "application/octet-stream"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(OutputPlugin)
+    try:
+        yield
+    finally:
+        pm.unregister(OutputPlugin)
+
+
+def test_invocations_file_output(client, file_output):
+    data = b"What's the shipping forecast for tomorrow"
+    response = client.post("/invocations", data=data)
+    assert response.data == data
+    assert response.headers["Content-Length"] == str(len(data))
+
+
+def test_prediction_direct_file_output(file_output):
+    data = b"What's the shipping forecast for tomorrow"
+    assert inference_server.testing.predict_direct(data) == data
+
+
+def test_remaining_length():
+    file = io.BytesIO(b"0123456789")
+    file.read(4)
+    assert inference_server._remaining_length(file) == 6
+    assert file.tell() == 4
+
+
+def test_invocations_invoke_fn(client):
+    class InvokePlugin:
+        """Plugin which handles an invocation in a single hook"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def invoke_fn(input_data, content_type, accept, model):
+            """Return the input data reversed"""
+            assert accept.best == "text/plain"
+            return model(input_data[::-1]), "text/plain"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(InvokePlugin)
+    try:
+        response = client.post("/invocations", data=b"forecast", headers={"Accept": "text/plain"})
+    finally:
+        pm.unregister(InvokePlugin)
+    assert response.data == b"tsacerof"
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+
+
+def test_invocations_invoke_fn_returns_none(client):
+    class InvokePlugin:
+        """Plugin which handles plain text invocations only"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def invoke_fn(input_data, content_type, accept, model):
+            """Return the input data reversed for plain text only"""
+            if content_type == "text/plain":
+                return model(input_data[::-1]), "text/plain"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(InvokePlugin)
+    try:
+        response = client.post("/invocations", data=b"forecast", content_type="application/octet-stream")
+    finally:
+        pm.unregister(InvokePlugin)
+    assert response.data == b"forecast"
+
+
+def test_invocations_invoke_fn_returns_none_input_stream(client):
+    class InvokePlugin:
+        """Plugin which never handles an invocation in a single hook"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def invoke_fn(input_data, content_type, accept, model):
+            """Leave the invocation to the other hooks"""
+            return None
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def input_stream_fn(stream, content_length, content_type):
+            """Read the stream, which must not have been consumed already"""
+            return stream.read()
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(InvokePlugin)
+    try:
+        response = client.post("/invocations", data=b"forecast")
+    finally:
+        pm.unregister(InvokePlugin)
+    assert response.data == b"forecast"
+
+
+def test_invocations_output_iter_fn(client):
+    events = []
+
+    class BatchPlugin:
+        """Plugin which predicts and serializes records one by one"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def predict_fn(data, model):
+            """Return a generator of predictions, one per line"""
+            for record in data.splitlines():
+                events.append(b"predicted " + record)
+                yield model(record)
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_iter_fn(prediction, accept):
+            """Return a generator of lines"""
+            return (record + b"\n" for record in prediction), "text/plain"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(BatchPlugin)
+    try:
+        response = client.post("/invocations", data=b"a\nb", buffered=False)
+        for chunk in response.iter_encoded():
+            events.append(b"sent " + chunk)
+        response.close()
+    finally:
+        pm.unregister(BatchPlugin)
+    assert events == [b"predicted a", b"sent a\n", b"predicted b", b"sent b\n"]
+    assert "Content-Length" not in response.headers
+
+
+def test_invocations_output_iter_fn_returns_none(client):
+    class OutputPlugin:
+        """Plugin which streams plain text output only"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_iter_fn(prediction, accept):
+            """Return a generator of lines for plain text only"""
+            if accept.best == "text/plain":
+                return iter(prediction.splitlines(keepends=True)), "text/plain"
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_fn(prediction, accept):
+            """Return the prediction as JSON"""
+            return inference_server.json.dumps(prediction.decode()), "application/json"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(OutputPlugin)
+    try:
+        response = client.post("/invocations", data=b"a\nb", headers={"Accept": "application/json"})
+    finally:
+        pm.unregister(OutputPlugin)
+    assert response.json == "a\nb"
+    assert response.headers["Content-Type"] == "application/json"
+
+
+def test_invocations_str_output(client):
+    class OutputPlugin:
+        """Plugin which returns the prediction as a string"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def output_fn(prediction, accept):
+            """Return the prediction decoded as a string"""
+            return prediction.decode(), "text/plain"
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(OutputPlugin)
+    try:
+        response = client.post("/invocations", data="Mer agitée".encode())
+    finally:
+        pm.unregister(OutputPlugin)
+    assert response.data == "Mer agitée".encode()
+    assert response.headers["Content-Length"] == str(len("Mer agitée".encode()))
+
+
 def test_invocations_custom_model_dir(model_using_dir):
     """Test the default plugin (which passes through any input bytes) using low-level testing.post_invocations"""
     data = b"What's the shipping forecast for tomorrow"
@@ -154,6 +515,11 @@ def test_prediction_no_serializer():
     assert prediction == input_data
 
 
+def test_prediction_no_serializer_large():
+    input_data = bytes(range(256)) * 4096
+    assert inference_server.testing.predict(input_data) == input_data
+
+
 def test_prediction_model_dir(model_using_dir):
     input_data = b"What's the shipping forecast for tomorrow"
     model_dir = pathlib.Path(__file__).parent
@@ -162,9 +528,107 @@ def test_prediction_model_dir(model_using_dir):
     assert prediction == input_data
 
 
+def test_prediction_direct_no_serializer():
+    input_data = b"What's the shipping forecast for tomorrow"
+    prediction = inference_server.testing.predict_direct(input_data)
+    assert prediction == input_data
+
+
+def test_prediction_direct_custom_serializer():
+    class Serializer:
+        @property
+        def CONTENT_TYPE(self) -> str:
+            return "application/octet-stream"
+
+        def serialize(self, data: str) -> bytes:
+            return data.encode()
+
+    class Deserializer:
+        @property
+        def ACCEPT(self) -> Tuple[str]:
+            return ("application/octet-stream",)
+
+        def deserialize(self, stream: botocore.response.StreamingBody, content_type: str) -> str:
+            assert content_type in self.ACCEPT
+            return stream.read().decode()
+
+    input_data = "What's the shipping forecast for tomorrow"
+    prediction = inference_server.testing.predict_direct(
+        input_data,
+        serializer=Serializer(),
+        deserializer=Deserializer(),
+    )
+    assert prediction == input_data
+
+
+def test_prediction_direct_model_dir(model_using_dir):
+    input_data = b"What's the shipping forecast for tomorrow"
+    model_dir = pathlib.Path(__file__).parent
+
+    prediction = inference_server.testing.predict_direct(input_data, model_dir=model_dir)
+    assert prediction == input_data
+
+
 def test_execution_parameters(client):
     response = client.get("/execution-parameters")
     assert response.data == b'{"BatchStrategy":"MultiRecord","MaxConcurrentTransforms":1,"MaxPayloadInMB":6}'
+    assert response.headers["Content-Type"] == "application/json"
+
+
+def test_execution_parameters_body_is_reused(client):
+    first = client.get("/execution-parameters")
+    second = client.get("/execution-parameters")
+    assert first.data == second.data
+    assert inference_server._plugin._EXECUTION_PARAMETERS_BODY is inference_server._plugin.execution_parameters_body()
+
+
+def test_execution_parameters_follow_plugin_registration(client):
+    class BatchPlugin:
+        """Plugin with a different batch strategy"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def batch_strategy():
+            """Invoke the model for a single record at a time"""
+            return inference_server.BatchStrategy.SINGLE_RECORD
+
+    assert client.get("/execution-parameters").json["BatchStrategy"] == "MultiRecord"
+    pm = inference_server.testing.plugin_manager()
+    pm.register(BatchPlugin)
+    try:
+        assert client.get("/execution-parameters").json["BatchStrategy"] == "SingleRecord"
+    finally:
+        pm.unregister(BatchPlugin)
+    assert client.get("/execution-parameters").json["BatchStrategy"] == "MultiRecord"
+
+
+def test_execution_parameters_plugin_registered_while_computing(client, monkeypatch):
+    class BatchPlugin:
+        """Plugin with a different batch strategy"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def batch_strategy():
+            """Invoke the model for a single record at a time"""
+            return inference_server.BatchStrategy.SINGLE_RECORD
+
+    pm = inference_server.testing.plugin_manager()
+    hooks = inference_server._plugin.hooks
+
+    def paused_hooks():
+        """Return the hooks, then register a plugin as if another thread did so before the body is cached"""
+        hooks_ = hooks()
+        pm.register(BatchPlugin)
+        return hooks_
+
+    inference_server._plugin._reset_caches()
+    monkeypatch.setattr(inference_server._plugin, "hooks", paused_hooks)
+    try:
+        assert client.get("/execution-parameters").json["BatchStrategy"] == "MultiRecord"
+        monkeypatch.undo()
+        assert client.get("/execution-parameters").json["BatchStrategy"] == "SingleRecord"
+    finally:
+        pm.unregister(BatchPlugin)
 
 
 def test_default_plugin_registered():
@@ -175,6 +639,55 @@ def test_invalid_hookimpl_fn():
     assert not inference_server.testing.hookimpl_is_valid(lambda x: x)
 
 
+def test_registered_hookimpl_is_valid():
+    class PingPlugin:
+        """Plugin which just defines a ping_fn"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def ping_fn(model):
+            """Return True"""
+            return True
+
+    pm = inference_server.testing.plugin_manager()
+    assert not inference_server.testing.hookimpl_is_valid(PingPlugin.ping_fn)
+    pm.register(PingPlugin)
+    try:
+        assert inference_server.testing.hookimpl_is_valid(PingPlugin.ping_fn)
+    finally:
+        pm.unregister(PingPlugin)
+    assert not inference_server.testing.hookimpl_is_valid(PingPlugin.ping_fn)
+
+
+def test_hookimpl_registered_while_collecting_is_valid(monkeypatch):
+    class PingPlugin:
+        """Plugin which just defines a ping_fn"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def ping_fn(model):
+            """Return False to simulate unhealthy service"""
+            return False
+
+    pm = inference_server.testing.plugin_manager()
+    load_hookimpl_functions = inference_server._plugin._load_hookimpl_functions
+
+    def paused_load_hookimpl_functions():
+        """Collect the functions, then register a plugin as if another thread did so before these are cached"""
+        hookimpl_functions = load_hookimpl_functions()
+        pm.register(PingPlugin)
+        return hookimpl_functions
+
+    inference_server._plugin._reset_caches()
+    monkeypatch.setattr(inference_server._plugin, "_load_hookimpl_functions", paused_load_hookimpl_functions)
+    try:
+        assert not inference_server.testing.hookimpl_is_valid(PingPlugin.ping_fn)
+        monkeypatch.undo()
+        assert inference_server.testing.hookimpl_is_valid(PingPlugin.ping_fn)
+    finally:
+        pm.unregister(PingPlugin)
+
+
 def test_default_model_fn_hook_is_valid():
     assert inference_server.testing.hookimpl_is_valid(inference_server.default_plugin.model_fn)
 
@@ -201,3 +714,128 @@ def test_default_max_concurrent_transforms_hook_is_valid():
 
 def test_default_max_payload_in_mb_hook_is_valid():
     assert inference_server.testing.hookimpl_is_valid(inference_server.default_plugin.max_payload_in_mb)
+
+
+def test_input_stream_fn_not_implemented_by_default():
+    assert inference_server._plugin.hooks().input_stream_fn is None
+
+
+def test_output_iter_fn_not_implemented_by_default():
+    assert inference_server._plugin.hooks().output_iter_fn is None
+
+
+def test_invoke_fn_not_implemented_by_default():
+    assert inference_server._plugin.hooks().invoke_fn is None
+
+
+def test_hooks_follow_plugin_registration(bad_ping):
+    assert inference_server._plugin.hooks().ping_fn(model=None) is False
+
+
+def test_hooks_registered_while_resolving(client, monkeypatch):
+    class PingPlugin:
+        """Plugin which just defines a ping_fn"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def ping_fn(model):
+            """Return False to simulate unhealthy service"""
+            return False
+
+    pm = inference_server.testing.plugin_manager()
+    load_hooks = inference_server._plugin._load_hooks
+
+    def paused_load_hooks():
+        """Resolve the hooks, then register a plugin as if another thread did so before the hooks are cached"""
+        hooks = load_hooks()
+        pm.register(PingPlugin)
+        return hooks
+
+    inference_server._plugin._reset_caches()
+    monkeypatch.setattr(inference_server._plugin, "_load_hooks", paused_load_hooks)
+    try:
+        assert inference_server._plugin.hooks().ping_fn(model=None) is True
+        monkeypatch.undo()
+        response = client.get("/ping")
+    finally:
+        pm.unregister(PingPlugin)
+    assert response.status_code == 503
+
+
+def test_hooks_single_implementation_called_directly():
+    hooks = inference_server._plugin.hooks()
+    assert hooks.input_fn is inference_server.default_plugin.input_fn
+    assert hooks.output_fn is inference_server.default_plugin.output_fn
+
+
+def test_hooks_cover_all_hookspecs():
+    pm = inference_server.testing.plugin_manager()
+    assert set(inference_server._plugin.Hooks._fields) == set(vars(pm.hook))
+
+
+def test_hooks_skip_none_results():
+    class NonePlugin:
+        """Plugin which defines a ping_fn returning None"""
+
+        @staticmethod
+        @inference_server.plugin_hook()
+        def ping_fn():
+            """Return None such that the next implementation is called"""
+            return None
+
+    pm = inference_server.testing.plugin_manager()
+    pm.register(NonePlugin)
+    try:
+        assert inference_server._plugin.hooks().ping_fn(model=None) is True
+    finally:
+        pm.unregister(NonePlugin)
+
+
+def test_hooks_with_hook_call_monitoring(client):
+    calls = []
+    undo = inference_server.testing.plugin_manager().add_hookcall_monitoring(
+        lambda hook_name, hook_impls, kwargs: calls.append(hook_name), lambda *args: None
+    )
+    try:
+        response = client.get("/ping")
+    finally:
+        undo()
+    assert response.status_code == 200
+    assert "ping_fn" in calls
+
+
+def test_json_loads():
+    assert inference_server.json.loads(b'{"location": "Fair Isle", "depth": [1, 2]}') == {
+        "location": "Fair Isle",
+        "depth": [1, 2],
+    }
+
+
+def test_json_loads_keys():
+    data = b'{"location": "Fair Isle", "depth": [1, 2], "sea": {"state": "rough"}, "wind": 8}'
+    assert inference_server.json.loads(data, keys=["depth", "sea"]) == {"depth": [1, 2], "sea": {"state": "rough"}}
+
+
+def test_json_loads_keys_without_simdjson(monkeypatch):
+    monkeypatch.setattr(inference_server.json, "simdjson", None)
+    data = b'{"location": "Fair Isle", "depth": [1, 2], "wind": 8}'
+    assert inference_server.json.loads(data, keys=["location", "wind"]) == {"location": "Fair Isle", "wind": 8}
+
+
+def test_json_loads_missing_key():
+    with pytest.raises(KeyError):
+        inference_server.json.loads(b'{"location": "Fair Isle"}', keys=["wind"])
+
+
+@pytest.mark.skipif(inference_server.json.simdjson is None, reason="simdjson is not installed")
+def test_json_loads_after_missing_key_error_is_kept():
+    try:
+        inference_server.json.loads(b'{"location": "Fair Isle"}', keys=["wind"])
+    except KeyError:
+        exc_info = sys.exc_info()  # Keep the traceback alive, like an error handler might
+    assert inference_server.json.loads(b'{"wind": 8}', keys=["wind"]) == {"wind": 8}
+    assert exc_info[0] is KeyError
+
+
+def test_json_dumps():
+    assert inference_server.json.dumps({"wind": 8}) == b'{"wind":8}'